@@ -1,49 +1,108 @@
 import re
-from bs4 import BeautifulSoup, Comment, Doctype
+import lxml.html
+from lxml import etree
 import sys
-from PIL import Image
+import numpy as np
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+from PIL import Image # pillow-simd (x86 SSE4/AVX2 only) installs as a drop-in with faster resize kernels
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import io
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 
 RESET = "\x1b[0m"
 
-def rgb_to_ansi_fg(r, g, b):
-    return f"\x1b[38;2;{r};{g};{b}m"
+_RESET_B = RESET.encode()
+# Fixed-width template for one character cell; colour channels are zero-padded to three digits
+_CELL = np.frombuffer("\x1b[38;2;000;000;000m\x1b[48;2;000;000;000m▄".encode(), dtype=np.uint8)
+_CHANNEL_OFFSETS = np.array([m.start() for m in re.finditer(b"000", _CELL.tobytes())], dtype=np.intp)
+_DIGITS = np.array([list(f"{i:03d}".encode()) for i in range(256)], dtype=np.uint8)
+_ROW_END = np.frombuffer(_RESET_B + b"\n", dtype=np.uint8)
+
+# Shared by page and image fetches so keep-alive connections are reused across requests;
+# transient connection errors and gateway failures are retried instead of failing the page
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                       max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504]))
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+@functools.lru_cache(maxsize=1024)
+def _compute_target(original_width, original_height, max_width=80, char_aspect_ratio=0.5, max_height_chars=80):
+    target_height_chars = int(original_height * max_width * char_aspect_ratio // original_width)
+    target_height_chars = max(1, target_height_chars + (target_height_chars % 2)) # Ensure even
 
-def rgb_to_ansi_bg(r, g, b):
-    return f"\x1b[48;2;{r};{g};{b}m"
+    resized_height_pixels = target_height_chars * 2
+    resized_width_pixels = original_width * resized_height_pixels // original_height
 
-def image_to_terminal_art(image_source, max_width=80, char_aspect_ratio=0.5):
+    if resized_width_pixels > max_width:
+        resized_width_pixels = max_width
+        resized_height_pixels = original_height * max_width // original_width
+        resized_height_pixels = max(2, resized_height_pixels + resized_height_pixels % 2)
+
+    # Bound the height of tall, narrow images, keeping the aspect ratio
+    max_height_pixels = max_height_chars * 2
+    if resized_height_pixels > max_height_pixels:
+        resized_width_pixels = max(1, resized_width_pixels * max_height_pixels // resized_height_pixels)
+        resized_height_pixels = max_height_pixels
+    return resized_width_pixels, resized_height_pixels
+
+def image_to_terminal_art(image_source, max_width=80, char_aspect_ratio=0.5, resample=Image.Resampling.LANCZOS, max_height_chars=80):
     try:
-        img = Image.open(image_source).convert("RGB")
+        img = Image.open(image_source)
+        # Let JPEG decode at a reduced scale that still covers the max_width target
+        img.draft("RGB", (max_width, max_width))
+        img = img.convert("RGB")
     except Exception as e:
         print(f"Error opening or processing image: {e}", file=sys.stderr)
         return
 
-    original_width, original_height = img.size
-    target_height_chars = int((original_height / original_width) * max_width * char_aspect_ratio)
-    target_height_chars = max(1, target_height_chars + (target_height_chars % 2)) # Ensure even
-
-    resized_height_pixels = target_height_chars * 2
-    resized_width_pixels = int(original_width * (resized_height_pixels / original_height))
-
-    if resized_width_pixels > max_width:
-        resized_width_pixels = max_width
-        resized_height_pixels = int(original_height * (resized_width_pixels / original_width))
-        resized_height_pixels += resized_height_pixels % 2
-
-    img = img.resize((resized_width_pixels, resized_height_pixels), Image.Resampling.LANCZOS)
-    pixels = img.load()
-
-    output_lines = []
-    for y in range(0, resized_height_pixels, 2):
-        line = []
-        for x in range(resized_width_pixels):
-            top_pixel_rgb = pixels[x, y]
-            bottom_pixel_rgb = pixels[x, min(y + 1, resized_height_pixels - 1)]
-            line.append(f"{rgb_to_ansi_fg(*bottom_pixel_rgb)}{rgb_to_ansi_bg(*top_pixel_rgb)}▄")
-        output_lines.append("".join(line) + RESET)
-    print("\n".join(output_lines))
+    resized_width_pixels, resized_height_pixels = _compute_target(*img.size, max_width, char_aspect_ratio, max_height_chars)
+    img = img.resize((resized_width_pixels, resized_height_pixels), resample)
+    pixels = np.asarray(img, dtype=np.uint8)
+
+    # Each character cell shows two pixel rows: the top one as background, the bottom one as "▄"
+    top = pixels[0::2]
+    bottom = pixels[1::2]
+    if len(bottom) < len(top):
+        bottom = np.concatenate((bottom, pixels[-1:]))
+
+    rows, width = top.shape[:2]
+    frame = np.empty((rows, width * len(_CELL) + len(_ROW_END)), dtype=np.uint8)
+    _fill_frame(top, bottom, frame)
+    return frame.tobytes()
+
+def _fill_frame_numpy(top, bottom, frame):
+    rows, width = top.shape[:2]
+    cells = np.broadcast_to(_CELL, (rows, width, len(_CELL))).copy()
+    for offset, channel in zip(_CHANNEL_OFFSETS, (*bottom.transpose(2, 0, 1), *top.transpose(2, 0, 1))):
+        cells[..., offset:offset + 3] = _DIGITS[channel]
+    frame[:, :-len(_ROW_END)] = cells.reshape(rows, -1)
+    frame[:, -len(_ROW_END):] = _ROW_END
+
+def _fill_frame_numba(top, bottom, frame):
+    rows, width = top.shape[0], top.shape[1]
+    cell_len = _CELL.shape[0]
+    for y in range(rows):
+        row = frame[y]
+        for x in range(width):
+            pos = x * cell_len
+            row[pos:pos + cell_len] = _CELL
+            for c in range(3):
+                for offset, value in ((_CHANNEL_OFFSETS[c], bottom[y, x, c]), (_CHANNEL_OFFSETS[c + 3], top[y, x, c])):
+                    row[pos + offset] = 48 + value // 100
+                    row[pos + offset + 1] = 48 + value // 10 % 10
+                    row[pos + offset + 2] = 48 + value % 10
+        row[width * cell_len:] = _ROW_END
+
+# Compiled per-cell loop when Numba is available, otherwise the array-wide NumPy fill
+_fill_frame = njit(cache=True, boundscheck=False)(_fill_frame_numba) if njit else _fill_frame_numpy
 
 BOLD = "\x1b[1m"
 UNDERLINE = "\x1b[4m"
@@ -55,149 +114,221 @@ BLUE_FG = "\x1b[34m"
 CYAN_FG = "\x1b[36m"
 WHITE_BG = "\x1b[47m"
 
-class TextNode:
-    def __init__(self, text):
-        self.text = text
-    def render(self):
-        return self.text
-
-class Anchor:
-    def __init__(self, text, href):
-        self.text = text
-        self.href = href
-    def render(self):
-        return f" {BLUE_FG}{UNDERLINE}{self.text}{RESET} "
-
-class Paragraph:
-    def __init__(self, content_parts):
-        self.content_parts = content_parts
-    def render(self):
-        return "".join(part.render() for part in self.content_parts) + "\n"
-
-class Heading:
-    def __init__(self, text, level=1):
-        self.text = text
-        self.level = level
-    def render(self):
-        style = {1: BLUE_FG, 2: GREEN_FG}.get(self.level, YELLOW_FG)
-        return f"\n{BOLD}{style}{'#' * self.level} {self.text}{RESET}\n"
-
-class ListElement:
-    def __init__(self, items_content_parts):
-        self.items_content_parts = items_content_parts
-    def render(self):
-        rendered_items = [f"{CYAN_FG}•{RESET} {"".join(part.render() for part in item_parts)}"
-                          for item_parts in self.items_content_parts]
-        return "\n".join(rendered_items) + "\n"
-
-class Button:
-    def __init__(self, label):
-        self.label = label
-    def render(self):
-        return f" {BLACK_FG}{WHITE_BG}{BOLD}[ {self.label} ]{RESET}\n"
-
-class Div:
-    def __init__(self, *elements):
-        self.elements = elements
-    def render(self):
-        return "\n\n" + "".join(element.render() for element in self.elements).strip('\n') + "\n\n"
-
-class ImageElement:
-    def __init__(self, src, base_url=None, max_width=80):
-        self.src = src
-        self.base_url = base_url
-        self.max_width = max_width
-
-    def render(self):
-        try:
-            image_url = self.src
-            if self.src.startswith("/") and self.base_url:
-                image_url = self.base_url.rstrip("/") + self.src
+# Pre-encoded markup so nodes append bytes straight into the page buffer
+_CLEAR_B = b"\033c"
+_BOLD_B = BOLD.encode()
+_STYLE_MAP = {1: BLUE_FG.encode(), 2: GREEN_FG.encode()}
+_DEFAULT_STYLE_B = YELLOW_FG.encode()
+_ANCHOR_START = f" {BLUE_FG}{UNDERLINE}".encode()
+_ANCHOR_END = f"{RESET} ".encode()
+_BULLET = f"{CYAN_FG}•{RESET} ".encode()
+_BUTTON_START = f" {BLACK_FG}{WHITE_BG}{BOLD}[ ".encode()
+_BUTTON_END = f" ]{RESET}\n".encode()
+
+IMAGE_MAX_WIDTH = 80
+IMAGE_RESAMPLE = Image.Resampling.LANCZOS # BICUBIC is faster and looks the same at terminal resolution
+
+# Node kinds of a PageDoc row
+K_TEXT, K_ANCHOR, K_P_BEGIN, K_P_END, K_H, K_LI, K_BTN, K_IMG, K_UL_END = range(9)
+
+# A parsed page as parallel lists, one row per node. attrs holds an anchor's href or an image's
+# prefetched art future; levels holds a heading's level, a list item's index in its list,
+# or 1 for an image inside inline content
+class PageDoc:
+    def __init__(self):
+        self.kinds = []
+        self.texts = []
+        self.attrs = []
+        self.levels = []
+
+    def append(self, kind, text="", attr=None, level=0):
+        self.kinds.append(kind)
+        self.texts.append(text)
+        self.attrs.append(attr)
+        self.levels.append(level)
+
+    def prefetch_images(self, pool):
+        for i, kind in enumerate(self.kinds):
+            if kind == K_IMG:
+                self.attrs[i] = pool.submit(_render_image_art, self.texts[i], IMAGE_MAX_WIDTH, IMAGE_RESAMPLE)
+
+def _fetch_bytes(url):
+    # Read the body in one go from the raw stream instead of assembling .content from chunks
+    with _SESSION.get(url, stream=True, timeout=5) as response:
+        response.raise_for_status()
+        return response.raw.read(decode_content=True)
+
+@functools.lru_cache(maxsize=128)
+def _render_image_art(url, max_width, resample):
+    return image_to_terminal_art(io.BytesIO(_fetch_bytes(url)), max_width=max_width, resample=resample)
+
+def _emit_text(buf, text, attr, level):
+    buf += text.encode()
+
+def _emit_anchor(buf, text, attr, level):
+    buf += _ANCHOR_START
+    buf += text.encode()
+    buf += _ANCHOR_END
+
+def _emit_nothing(buf, text, attr, level):
+    pass
+
+def _emit_newline(buf, text, attr, level):
+    buf += b"\n"
+
+def _emit_heading(buf, text, attr, level):
+    buf += b"\n" + _BOLD_B + _STYLE_MAP.get(level, _DEFAULT_STYLE_B) + b"#" * level + b" "
+    buf += text.encode()
+    buf += _RESET_B + b"\n"
+
+def _emit_list_item(buf, text, attr, level):
+    if level:
+        buf += b"\n"
+    buf += _BULLET
+
+def _emit_button(buf, text, attr, level):
+    buf += _BUTTON_START
+    buf += text.encode()
+    buf += _BUTTON_END
+
+def _emit_image(buf, src, future, level):
+    try:
+        art = future.result() if future else _render_image_art(src, IMAGE_MAX_WIDTH, IMAGE_RESAMPLE)
+        if art:
+            if buf and not buf.endswith(b"\n"): # Inline images start on their own line
+                buf += b"\n"
+            buf += art
+        buf += f"\n[Image: {src}]\n\n".encode()
+    except Exception as e:
+        if level: # Failed top-level images render nothing, as they always have
+            buf += f"\n[Error rendering image {src}: {e}]\n".encode()
 
-            response = requests.get(image_url, timeout=5)
-            response.raise_for_status()
+# Indexed by node kind
+_EMIT = (_emit_text, _emit_anchor, _emit_nothing, _emit_newline, _emit_heading,
+         _emit_list_item, _emit_button, _emit_image, _emit_newline)
 
-            image_file = io.BytesIO(response.content)
-            image_to_terminal_art(image_file, max_width=self.max_width)
-            print(f"\n[Image: {image_url}]\n")
-            return ""
-        except Exception as e:
-            return f"\n[Error rendering image {self.src}: {e}]\n"
+_SKIP_TAGS = frozenset({'style', 'script', 'noscript'})
+_HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3}
+# Descendant text of an element, leaving out anything inside skipped tags such as inline SVG <style>
+_VISIBLE_TEXT = etree.XPath('.//text()[not(ancestor::script or ancestor::style or ancestor::noscript)]')
+
+def _visible_text(tag):
+    return "".join(_VISIBLE_TEXT(tag)).strip()
+
+_XML_DECL_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+_IE_COND_RE = re.compile(r'endif|\[if|<!', re.I) # Leftovers of IE conditional comments
 
 class Parser:
     def parse(self, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        page_title = soup.find('title').get_text(strip=True) if soup.find('title') else "No Title"
-        return self._parse_elements(soup.find('html') or soup), page_title
-
-    def _parse_elements(self, tag):
-        if isinstance(tag, str):
-            return [TextNode(tag.strip())] if tag.strip() else []
-        if not hasattr(tag, 'name') or isinstance(tag, (Comment, Doctype)) or tag.name.lower() in {'style', 'script', 'noscript'}:
-            return []
-
-        tag_name = tag.name.lower()
-        if tag_name in ['h1', 'h2', 'h3']:
-            return [Heading(tag.get_text(strip=True), level=int(tag_name[1]))]
-        elif tag_name == 'p':
-            return [Paragraph(self._parse_inline_content(tag))]
-        elif tag_name == 'ul':
-            return [ListElement([self._parse_inline_content(li) for li in tag.find_all('li', recursive=False)])]
-        elif tag_name == 'a':
-            text = tag.get_text(strip=True)
-            return [Anchor(text, tag.get('href', '#'))] if text else []
-        elif tag_name == 'button':
-            return [Button(tag.get_text(strip=True))]
-        elif tag_name == 'img':
-            return [ImageElement(tag['src'])] if 'src' in tag.attrs else []
-        else: # Container elements or unsupported tags
-            elements = []
-            for child in tag.contents:
-                elements.extend(self._parse_elements(child))
-            return elements or ([TextNode(tag.get_text(strip=True))] if tag.get_text(strip=True) else [])
-
-    def _parse_inline_content(self, parent_tag):
-        parsed_inline_elements = []
-        for content_node in parent_tag.contents:
-            if isinstance(content_node, (Comment, Doctype)):
-                continue
-            if isinstance(content_node, str):
-                text = content_node.strip()
-                if text and "endif" not in text.lower() and "[if" not in text.lower() and "<!" not in text:
-                    parsed_inline_elements.append(TextNode(text))
-            elif hasattr(content_node, 'name'):
-                tag_name = content_node.name.lower()
-                if tag_name in {'script', 'style', 'noscript'}:
-                    continue
-                elif tag_name == 'a':
-                    text = content_node.get_text(strip=True)
-                    if text:
-                        parsed_inline_elements.append(Anchor(text, content_node.get('href', '#')))
-                elif tag_name == 'img':
-                    if 'src' in content_node.attrs:
-                        parsed_inline_elements.append(ImageElement(content_node['src']))
-                else:
-                    text = content_node.get_text(strip=True)
-                    if text:
-                        parsed_inline_elements.append(TextNode(text))
-        return parsed_inline_elements
+        doc = PageDoc()
+        # lxml refuses str input that carries an encoding declaration, as XHTML pages often do
+        html = _XML_DECL_RE.sub('', html, count=1)
+        try:
+            root = lxml.html.document_fromstring(html)
+        except (etree.ParserError, ValueError):
+            return doc, "No Title"
+        page_title = root.findtext('.//title')
+        page_title = page_title.strip() if page_title is not None else "No Title"
+        self._parse_elements(root, doc)
+        return doc, page_title
+
+    def _parse_elements(self, tag, doc):
+        tag_name = tag.tag
+        if not isinstance(tag_name, str) or tag_name in _SKIP_TAGS:
+            return # Comments, processing instructions and skipped tags
+
+        handler = self._HANDLERS.get(tag_name)
+        if handler:
+            handler(self, tag, doc)
+            return
+
+        # Container elements or unsupported tags
+        self._parse_text(tag.text, doc)
+        for child in tag:
+            self._parse_elements(child, doc)
+            self._parse_text(child.tail, doc)
+
+    def _parse_heading(self, tag, doc):
+        doc.append(K_H, _visible_text(tag), level=_HEADINGS[tag.tag])
+
+    def _parse_paragraph(self, tag, doc):
+        doc.append(K_P_BEGIN)
+        self._parse_inline_content(tag, doc)
+        doc.append(K_P_END)
+
+    def _parse_list(self, tag, doc):
+        for i, li in enumerate(tag.iterchildren('li')):
+            doc.append(K_LI, level=i)
+            self._parse_inline_content(li, doc)
+        doc.append(K_UL_END)
+
+    def _parse_anchor(self, tag, doc):
+        text = _visible_text(tag)
+        if text:
+            doc.append(K_ANCHOR, text, tag.get('href', '#'))
+
+    def _parse_button(self, tag, doc):
+        doc.append(K_BTN, _visible_text(tag))
+
+    def _parse_image(self, tag, doc, inline=False):
+        if 'src' in tag.attrib:
+            doc.append(K_IMG, tag.get('src'), level=int(inline))
+
+    _HANDLERS = {
+        'h1': _parse_heading, 'h2': _parse_heading, 'h3': _parse_heading,
+        'p': _parse_paragraph,
+        'ul': _parse_list,
+        'a': _parse_anchor,
+        'button': _parse_button,
+        'img': _parse_image,
+    }
+
+    def _parse_text(self, text, doc):
+        text = text.strip() if text else ""
+        if text:
+            doc.append(K_TEXT, text)
+
+    def _parse_inline_content(self, parent_tag, doc):
+        self._append_inline_text(parent_tag.text, doc)
+        for content_node in parent_tag:
+            tag_name = content_node.tag
+            if not isinstance(tag_name, str) or tag_name in _SKIP_TAGS:
+                pass
+            elif tag_name == 'a':
+                self._parse_anchor(content_node, doc)
+            elif tag_name == 'img':
+                self._parse_image(content_node, doc, inline=True)
+            else:
+                text = _visible_text(content_node)
+                if text:
+                    doc.append(K_TEXT, text)
+            self._append_inline_text(content_node.tail, doc)
 
-class Renderer:
-    def clear(self):
-        print("\033c", end="")
+    def _append_inline_text(self, text, doc):
+        text = text.strip() if text else ""
+        if text and not _IE_COND_RE.search(text):
+            doc.append(K_TEXT, text)
 
-    def render(self, elements, title=None):
+class Renderer:
+    def render(self, doc, title=None, clear=False):
+        buf = bytearray(_CLEAR_B if clear else b"")
         if title:
-            print(f"{BOLD}{CYAN_FG}{'=' * (len(title) + 6)}\n=== {title} ===\n{'=' * (len(title) + 6)}{RESET}\n")
-        for element in elements:
-            if isinstance(element, ImageElement):
-                element.render()
-            else:
-                print(element.render(), end='')
+            buf += f"{BOLD}{CYAN_FG}{'=' * (len(title) + 6)}\n=== {title} ===\n{'=' * (len(title) + 6)}{RESET}\n\n".encode()
+        emit = _EMIT
+        for kind, text, attr, level in zip(doc.kinds, doc.texts, doc.attrs, doc.levels):
+            emit[kind](buf, text, attr, level)
+        sys.stdout.flush() # Anything already printed goes out before the page
+        out = getattr(sys.stdout, "buffer", None)
+        if out is None: # Text-only replacement such as io.StringIO
+            sys.stdout.write(buf.decode())
+        else:
+            out.write(buf)
+            out.flush()
+
+    def refresh(self, doc, title=None):
+        self.render(doc, title, clear=True)
 
-    def refresh(self, elements, title=None):
-        self.clear()
-        self.render(elements, title)
+_PAGE_CACHE_SIZE = 128
 
 class Browser:
     def __init__(self):
@@ -205,6 +336,8 @@ class Browser:
         self.current_url = None
         self.parser = Parser()
         self.renderer = Renderer()
+        self.image_pool = ThreadPoolExecutor(max_workers=8)
+        self.page_cache = OrderedDict() # url -> HTML, least recently used first
         self.search_db = {
             "hello": """<title>Hello World!</title><h1>Hello Page</h1><p>Welcome to the hello page!</p><img src="hello_image.png" alt="Hello"><ul><li>Greeting</li><li>World</li></ul>""",
             "python": """<title>Python Info</title><h1>Python Programming</h1><p>Python is a high-level, interpreted programming language.</p><p>Learn more at <a href="https://python.org">python.org</a>.</p><button>Go to Python Website</button>""",
@@ -216,7 +349,7 @@ class Browser:
         self.history.append(url)
         self._load_content(url)
 
-    def _load_content(self, url):
+    def _load_content(self, url, use_cache=False):
         html_content = ""
         try:
             if url == "home":
@@ -229,11 +362,18 @@ class Browser:
             else:
                 if not url.startswith(("http://", "https://")):
                     url = "https://" + url
-                print(f"Fetching {url}...")
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                html_content = response.text
-                print(f"Successfully fetched {url}")
+                if use_cache and url in self.page_cache:
+                    self.page_cache.move_to_end(url)
+                    html_content = self.page_cache[url]
+                else:
+                    print(f"Fetching {url}...")
+                    response = _SESSION.get(url, timeout=10)
+                    response.raise_for_status()
+                    html_content = self.page_cache[url] = response.text
+                    self.page_cache.move_to_end(url)
+                    if len(self.page_cache) > _PAGE_CACHE_SIZE:
+                        self.page_cache.popitem(last=False)
+                    print(f"Successfully fetched {url}")
         except requests.exceptions.RequestException as e:
             html_content = f"""<title>Error</title><h1>Error Loading Page</h1><p>Could not load {url}</p><p>Error: {e}</p><p>Please check the URL and your internet connection.</p>"""
             print(f"Error fetching {url}: {e}", file=sys.stderr)
@@ -241,14 +381,15 @@ class Browser:
             html_content = f"""<title>Unexpected Error</title><h1>An Unexpected Error Occurred</h1><p>Error: {e}</p>"""
             print(f"An unexpected error occurred: {e}", file=sys.stderr)
 
-        elements, page_title = self.parser.parse(html_content)
-        self.renderer.refresh(elements, page_title)
+        doc, page_title = self.parser.parse(html_content)
+        doc.prefetch_images(self.image_pool) # Download all images up front, render waits per image
+        self.renderer.refresh(doc, page_title)
 
     def go_back(self):
         if len(self.history) > 1:
             self.history.pop()
             self.current_url = self.history[-1]
-            self._load_content(self.current_url)
+            self._load_content(self.current_url, use_cache=True)
         else:
             print("No history to go back to.")
 
@@ -269,6 +410,7 @@ class Browser:
             user_input = input("> ")
             if user_input == "quit":
                 print("Exiting browser.")
+                self.image_pool.shutdown(wait=False, cancel_futures=True)
                 break
             self.handle_input(user_input)
 